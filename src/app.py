@@ -1,11 +1,17 @@
+import hmac
 import os
+import time
+
+_IMPORT_STARTED = time.perf_counter()
 
-from dotenv import load_dotenv
 from flask import Flask, jsonify, redirect, request, session
 from flask_cors import CORS
 
 from lib.enums import ReturnTypes, SpotifyClientNotAuthenticated
-from lib.pymongo_client import create_pymongo_client
+from lib.like_buffer import LikeBuffer
+from lib.prefetcher import TRACK_PREFETCHER
+from lib.pymongo_client import REGISTRY, create_pymongo_client
+from lib.settings import get_settings
 from lib.spotipy_client import create_spotify_client
 from routes import profile, social, spotify
 
@@ -17,10 +23,25 @@ CORS(
 )
 
 # LOAD SECRET KEY
-load_dotenv()
-app.secret_key = os.getenv("SECRET_APP_KEY")
+SETTINGS = get_settings()
+app.secret_key = SETTINGS.secret_app_key
 
+# Connections are opened lazily on first use in each worker, warm_up opens
+# them eagerly from gunicorn's post_fork hook (gunicorn.conf.py)
 MONGO_DB = create_pymongo_client("users")
+LIKE_BUFFER = LikeBuffer(MONGO_DB)
+_WARM_PID = None
+
+
+def warm_up():
+    """Open per-process resources; call from gunicorn's post_fork hook"""
+    global _WARM_PID
+    if _WARM_PID == os.getpid():
+        return
+    # Replaying journals only touches local disk, so it must not wait on Mongo
+    LIKE_BUFFER.start()
+    MONGO_DB.warm_up()
+    _WARM_PID = os.getpid()
 
 
 # AUTH FLOW
@@ -59,6 +80,20 @@ def me():
         return jsonify({"error": "Failed to fetch user info"}), 500
 
 
+@app.route("/api/metrics/mongo-pool", methods=["GET"])
+def mongo_pool_metrics():
+    """Return connection pool checkout waits and in-use counts.
+
+    Only served when METRICS_TOKEN is set and sent as X-Metrics-Token.
+    """
+    token = request.headers.get("X-Metrics-Token", "")
+    if not SETTINGS.metrics_token or not hmac.compare_digest(
+        token, SETTINGS.metrics_token
+    ):
+        return "Not found", 404
+    return jsonify(REGISTRY.metrics()), 200
+
+
 # USER DATA ENDPOINTS
 @app.route("/api/profile/<username>", methods=["GET"])
 def get_profile_data(username):
@@ -67,7 +102,9 @@ def get_profile_data(username):
     if token_info:
         session["token_info"] = token_info
     try:
-        return profile.get_profile_data(username, MONGO_DB, client)
+        return profile.get_profile_data(
+            username, MONGO_DB, client, session.get("username", "")
+        )
     except SpotifyClientNotAuthenticated:
         return ReturnTypes.UserNotAuthenticated, 401
     except Exception as exc:
@@ -127,6 +164,16 @@ def spotify_search():
     return jsonify(spotify.spotify_search(request, client)), 200
 
 
+def _prefetch_tracks(client, albums):
+    """Queue track prefetches; never fails the response it follows"""
+    try:
+        TRACK_PREFETCHER.prefetch(
+            client, [a.get("albumId") for a in albums], session.get("username", "")
+        )
+    except Exception as exc:
+        print(exc)
+
+
 @app.route("/api/spotify/trending", methods=["GET"])
 def trending_albums():
     """Get trending/new release albums"""
@@ -134,7 +181,9 @@ def trending_albums():
     if token_info:
         session["token_info"] = token_info
     try:
-        return jsonify(spotify.get_trending_albums(client)), 200
+        albums = spotify.get_trending_albums(client)
+        _prefetch_tracks(client, albums)
+        return jsonify(albums), 200
     except SpotifyClientNotAuthenticated:
         return ReturnTypes.UserNotAuthenticated, 401
     except Exception as exc:
@@ -148,7 +197,9 @@ def popular_albums():
     if token_info:
         session["token_info"] = token_info
     try:
-        return jsonify(spotify.get_popular_albums(client)), 200
+        albums = spotify.get_popular_albums(client)
+        _prefetch_tracks(client, albums)
+        return jsonify(albums), 200
     except SpotifyClientNotAuthenticated:
         return ReturnTypes.UserNotAuthenticated, 401
     except Exception as exc:
@@ -219,14 +270,30 @@ def unfollow_user(target_username):
         return str(exc), 500
 
 
+def _like_target(username):
+    """Return (postOwner, albumId, error response) for a like/unlike request"""
+    if not username:
+        return None, None, (ReturnTypes.UserNotAuthenticated, 401)
+    payload = request.get_json(silent=True) or {}
+    post_owner = payload.get("postOwner")
+    album_id = payload.get("albumId")
+    if not (post_owner and isinstance(post_owner, str)) or not (
+        album_id and isinstance(album_id, str)
+    ):
+        return None, None, ("postOwner and albumId are required", 400)
+    return post_owner, album_id, None
+
+
 @app.route("/api/social/like", methods=["POST"])
 def like_post():
     """Like a post"""
     username = session.get("username", "")
-    post_owner = request.json.get("postOwner")
-    album_id = request.json.get("albumId")
+    post_owner, album_id, error = _like_target(username)
+    if error:
+        return error
     try:
-        return social.like_post(username, MONGO_DB, post_owner, album_id)
+        LIKE_BUFFER.like(post_owner, album_id, username)
+        return "Like recorded", 200
     except Exception as exc:
         print(exc)
         return str(exc), 500
@@ -236,10 +303,12 @@ def like_post():
 def unlike_post():
     """Unlike a post"""
     username = session.get("username", "")
-    post_owner = request.json.get("postOwner")
-    album_id = request.json.get("albumId")
+    post_owner, album_id, error = _like_target(username)
+    if error:
+        return error
     try:
-        return social.unlike_post(username, MONGO_DB, post_owner, album_id)
+        LIKE_BUFFER.unlike(post_owner, album_id, username)
+        return "Unlike recorded", 200
     except Exception as exc:
         print(exc)
         return str(exc), 500
@@ -268,5 +337,13 @@ def get_user_profile_public(username):
         return str(exc), 500
 
 
+IMPORT_TIME_MS = (time.perf_counter() - _IMPORT_STARTED) * 1000
+if IMPORT_TIME_MS > SETTINGS.import_budget_ms:
+    print(
+        f"app import took {IMPORT_TIME_MS:.0f}ms "
+        f"(budget {SETTINGS.import_budget_ms:.0f}ms)"
+    )
+
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8888, debug=True)
@@ -0,0 +1 @@
+# Makes `lib` and `routes` importable when pytest runs from the repo root
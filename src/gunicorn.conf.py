@@ -0,0 +1,10 @@
+# gunicorn -c gunicorn.conf.py --preload app:app
+def post_fork(server, worker):
+    """Open Mongo and start the like buffer in each worker after the fork"""
+    from app import warm_up
+
+    try:
+        warm_up()
+    except Exception as exc:
+        # Connections still open lazily on first use
+        server.log.warning("warm up failed: %s", exc)
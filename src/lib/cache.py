@@ -0,0 +1,29 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Small thread-safe LRU cache shared by the request threads of a worker"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
@@ -0,0 +1,52 @@
+import threading
+import time
+
+
+class CircuitBreaker:
+    """Stop calling an upstream after consecutive failures.
+
+    After `failure_threshold` errors or timeouts in a row the breaker opens and
+    `allow()` returns False for `reset_timeout` seconds. Then a single trial
+    call is let through (half open); its outcome closes or reopens the breaker.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self.state = self.CLOSED
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_running = False
+            if self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_running = False
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self.state == self.HALF_OPEN or (
+                self._failures >= self.failure_threshold
+            ):
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
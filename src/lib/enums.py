@@ -15,5 +15,9 @@ class SpotifyAPIError(Exception):
     pass
 
 
+class SpotifyUnavailable(SpotifyAPIError):
+    pass
+
+
 class SpotifyClientNotAuthenticated(Exception):
     pass
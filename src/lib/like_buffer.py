@@ -0,0 +1,359 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from lib.settings import get_settings
+
+RECENT_LIKERS_LIMIT = 20
+
+# Posts liked before the buffer existed only have the legacy `likes` array,
+# which seeds `likers` on the first buffered update (see backfill_likers)
+_OLD_LIKERS = {"$ifNull": ["$$post.likers", {"$ifNull": ["$$post.likes", []]}]}
+
+
+class LikeBuffer:
+    """Buffer like/unlike events per process and flush them as one bulk write.
+
+    Events are coalesced per (postOwner, albumId) into one update per post,
+    and a like and an unlike by the same user in one window cancel out. The
+    update rewrites the post's `likers` set with set operations and derives
+    `likeCount` from its size, which makes flushes, retries and journal
+    replays idempotent. `recentLikers` is only a capped list for display.
+
+    Every acknowledged event is appended to a journal file first, so a crash
+    before the next flush is replayed on the next start instead of being lost.
+    """
+
+    def __init__(
+        self,
+        mongo_db,
+        journal_dir=None,
+        flush_interval=2.0,
+        recent_limit=RECENT_LIKERS_LIMIT,
+    ):
+        self.mongo_db = mongo_db
+        self.flush_interval = flush_interval
+        self.recent_limit = recent_limit
+        self.journal_dir = journal_dir or get_settings().like_journal_dir
+        self._pid = None
+        self._start_lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._reinit_start_lock)
+        self._reset()
+
+    def _reinit_start_lock(self):
+        # Another thread may have held the lock when the parent forked
+        self._start_lock = threading.Lock()
+
+    def _reset(self):
+        self._pending = {}  # (post_owner, album_id) -> {liker: +1 | -1}
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._journal = None
+        self._journal_path = None
+        self._written = 0  # events written to the journal
+        self._synced = 0  # events known to be on disk
+
+    # LIFECYCLE
+    def start(self):
+        """Replay orphaned journals and start the periodic flush thread.
+
+        Safe to call repeatedly; after a fork the child drops the parent's
+        state and starts its own thread and journal.
+        """
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # The parent keeps flushing its own buffer and journal
+                self._reset()
+            os.makedirs(self.journal_dir, exist_ok=True)
+            self._open_journal()
+            self._replay_orphans()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+            # Set last so no other thread records before the journal exists
+            self._pid = os.getpid()
+
+    def stop(self):
+        """Stop the flush thread and flush whatever is still buffered"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.flush_interval + 1)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as exc:
+                print(exc)
+
+    # PUBLIC METHODS
+    def like(self, post_owner, album_id, username):
+        self._record(post_owner, album_id, username, 1)
+
+    def unlike(self, post_owner, album_id, username):
+        self._record(post_owner, album_id, username, -1)
+
+    def flush(self):
+        """Write all buffered events with a single unordered bulk_write"""
+        with self._flush_lock:
+            with self._sync_lock, self._lock:
+                pending, self._pending = self._pending, {}
+                journal_path = self._rotate_journal()
+
+            events, requests = self._build_requests(pending)
+            if requests:
+                try:
+                    self.mongo_db.bulk_write(requests, ordered=False)
+                except BulkWriteError as exc:
+                    # The other ops were applied, only retry the failed ones
+                    failed = {e["index"] for e in exc.details.get("writeErrors", [])}
+                    retry = [e for i in sorted(failed) for e in events[i]]
+                    self._load(retry, retry=True)
+                    self._remove(journal_path)
+                    raise
+                except Exception:
+                    # Updates are idempotent, so retrying the whole batch is safe
+                    self._load([e for post in events for e in post], retry=True)
+                    self._remove(journal_path)
+                    raise
+            self._remove(journal_path)
+
+    # HELPERS
+    def _record(self, post_owner, album_id, username, delta):
+        self.start()
+        self._load([{"o": post_owner, "a": album_id, "u": username, "d": delta}])
+
+    def _load(self, events, retry=False):
+        """Apply events to the buffer and make them durable in the journal.
+
+        Retried events never override a newer action buffered meanwhile.
+        """
+        if not events:
+            return
+        with self._lock:
+            for event in events:
+                if retry and event["u"] in self._pending.get(
+                    (event["o"], event["a"]), {}
+                ):
+                    continue
+                if self._journal:
+                    self._journal.write(json.dumps(event) + "\n")
+                    self._written += 1
+                self._apply(event)
+            if self._journal:
+                self._journal.flush()
+            seq = self._written
+        self._sync(seq)
+
+    def _sync(self, seq):
+        """Group commit: one fsync covers every event written before it"""
+        with self._sync_lock:
+            if self._synced >= seq or not self._journal:
+                return
+            with self._lock:
+                target = self._written
+                fd = self._journal.fileno()
+            # Rotation needs the sync lock, so fd stays open while we fsync
+            os.fsync(fd)
+            self._synced = target
+
+    def _apply(self, event):
+        key = (event["o"], event["a"])
+        likers = self._pending.setdefault(key, {})
+        if likers.get(event["u"], event["d"]) != event["d"]:
+            # A like and an unlike in the same window cancel out
+            del likers[event["u"]]
+            if not likers:
+                del self._pending[key]
+        else:
+            likers[event["u"]] = event["d"]
+
+    def _build_requests(self, pending):
+        """Return one update per post and the events behind each, index aligned"""
+        events, requests = [], []
+        for (post_owner, album_id), likers in pending.items():
+            events.append(
+                [
+                    {"o": post_owner, "a": album_id, "u": username, "d": delta}
+                    for username, delta in likers.items()
+                ]
+            )
+            liked = [u for u, d in likers.items() if d > 0]
+            unliked = [u for u, d in likers.items() if d < 0]
+            posts = self._posts_update(album_id, liked, unliked)
+            requests.append(
+                UpdateOne(
+                    {"username": post_owner, "posts.albumId": album_id},
+                    [{"$set": {"posts": posts}}],
+                )
+            )
+        return events, requests
+
+    def _posts_update(self, album_id, liked, unliked):
+        """Aggregation expression rewriting the liked post inside `posts`.
+
+        likers is updated with set operations and likeCount derived from its
+        size, so applying the same update twice changes nothing.
+        """
+        # Usernames are data, never field paths
+        liked, unliked = {"$literal": liked}, {"$literal": unliked}
+        new_likers = {
+            "$setUnion": [{"$setDifference": ["$$old", unliked]}, liked]
+        }
+        recent = {
+            "$slice": [
+                {
+                    "$concatArrays": [
+                        {
+                            "$filter": {
+                                "input": {"$ifNull": ["$$post.recentLikers", []]},
+                                "cond": {"$not": [{"$in": ["$$this", unliked]}]},
+                            }
+                        },
+                        {"$setDifference": [liked, "$$old"]},
+                    ]
+                },
+                -self.recent_limit,
+            ]
+        }
+        return {
+            "$map": {
+                "input": "$posts",
+                "as": "post",
+                "in": {
+                    "$cond": [
+                        {"$eq": ["$$post.albumId", album_id]},
+                        {
+                            "$let": {
+                                "vars": {"old": _OLD_LIKERS},
+                                "in": {
+                                    "$mergeObjects": [
+                                        "$$post",
+                                        {
+                                            "likers": new_likers,
+                                            "likeCount": {"$size": new_likers},
+                                            "recentLikers": recent,
+                                        },
+                                    ]
+                                },
+                            }
+                        },
+                        "$$post",
+                    ]
+                },
+            }
+        }
+
+    def _journal_name(self):
+        # The start nonce keeps a reused PID from appending to a dead
+        # worker's journal
+        return os.path.join(
+            self.journal_dir, f"likes-{os.getpid()}-{time.time_ns()}.jsonl"
+        )
+
+    def _open_journal(self):
+        self._journal_path = self._journal_name()
+        self._journal = open(self._journal_path, "a", encoding="utf-8")
+
+    def _rotate_journal(self):
+        """Seal the current journal for the flush and start a fresh one"""
+        if not self._journal:
+            return None
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._journal.close()
+        self._synced = self._written
+        sealed = f"{self._journal_path}.{time.time_ns()}.flushing"
+        os.rename(self._journal_path, sealed)
+        self._open_journal()
+        return sealed
+
+    def _remove(self, path):
+        if path:
+            os.remove(path)
+
+    def _replay_orphans(self):
+        """Claim journals left by dead processes and load them into the buffer"""
+        own = os.path.basename(self._journal_path)
+        for path in glob.glob(os.path.join(self.journal_dir, "likes-*")):
+            name = os.path.basename(path)
+            if name == own:
+                continue
+            if name.endswith(".claimed"):
+                # A worker that died mid-replay leaves its claim behind
+                owner = name.rsplit(".", 2)[1]
+                original = path.rsplit(".", 2)[0]
+            else:
+                owner = name.split("-")[1].split(".")[0]
+                original = path
+            if not _is_orphan(owner):
+                continue
+            claimed = f"{original}.{os.getpid()}.claimed"
+            try:
+                os.rename(path, claimed)  # only one worker wins the rename
+            except OSError:
+                continue
+            with open(claimed, "r", encoding="utf-8") as f:
+                events = [json.loads(line) for line in f if line.strip()]
+            self._load(events)
+            os.remove(claimed)
+
+
+def backfill_likers(mongo_db):
+    """One-off migration seeding `likers` and `likeCount` from legacy `likes`.
+
+    Buffered updates seed a post lazily on its next like or unlike; run this
+    once so posts that aren't touched again also show the right count.
+    """
+    return mongo_db.update_many(
+        {"posts": {"$elemMatch": {"likers": {"$exists": False}}}},
+        [
+            {
+                "$set": {
+                    "posts": {
+                        "$map": {
+                            "input": "$posts",
+                            "as": "post",
+                            "in": {
+                                "$mergeObjects": [
+                                    "$$post",
+                                    {
+                                        "likers": _OLD_LIKERS,
+                                        "likeCount": {"$size": _OLD_LIKERS},
+                                    },
+                                ]
+                            },
+                        }
+                    }
+                }
+            }
+        ],
+    )
+
+
+def _is_orphan(pid):
+    """True if the journal owner is gone; our own PID means a previous life"""
+    if not pid.isdigit() or int(pid) == os.getpid():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
@@ -1,13 +1,166 @@
+"""Offline cleaning of Spotify album dumps.
+
+Run from src/ with `python -m lib.local_helpers <input> <output>`, or pass
+`--collection albums` to load the cleaned albums straight into Mongo.
+"""
+import argparse
 import json
-from spotify_helpers import clean_albums_data
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+from lib.spotify_helpers import clean_albums_data
+
+READ_SIZE = 1 << 20
+
+
+def iter_raw_albums(f, read_size=READ_SIZE):
+    """Yield the JSON text of each album in a JSON array or NDJSON file.
+
+    Only album boundaries are found here, parsing for real happens in the
+    workers. Just the current read window and album are held in memory, so
+    the size of the dump doesn't matter.
+    """
+    first = f.read(read_size)
+    chunks = _iter_reads(f, first, read_size)
+    if first.lstrip().startswith("["):
+        yield from _iter_array_items(chunks)
+    else:
+        yield from _iter_lines(chunks)
+
+
+def iter_json_albums(f, read_size=READ_SIZE):
+    """Yield parsed albums one at a time, see iter_raw_albums"""
+    return map(json.loads, iter_raw_albums(f, read_size))
+
+
+def _iter_reads(f, first, read_size):
+    yield first
+    while chunk := f.read(read_size):
+        yield chunk
+
+
+def _iter_lines(chunks):
+    carry = ""
+    for chunk in chunks:
+        lines = (carry + chunk).split("\n")
+        carry = lines.pop()
+        yield from (line for line in lines if line.strip())
+    if carry.strip():
+        yield carry
+
+
+def _iter_array_items(chunks):
+    """Yield the text of each item of a top-level JSON array.
 
-def write_data_from_file(input_file, output_file):
-    with open(input_file, "r", encoding="utf-8") as f:
-        albums = json.load(f)
+    raw_decode (C speed) only locates item boundaries; the decoded object is
+    dropped and the workers parse the text again, so nothing but strings is
+    pickled to the pool. NDJSON input skips even this pass.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+    chunks = iter(chunks)
+    while True:
+        # Skip the opening bracket, separators and whitespace between items
+        while pos < len(buffer) and buffer[pos] in "[,\r\n\t ":
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        if pos == len(buffer):
+            if eof:
+                raise ValueError("Album dump ends inside the top-level array")
+            buffer, pos = next(chunks, ""), 0
+            eof = not buffer
+            continue
+        try:
+            _, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise ValueError("Album dump ends inside the top-level array")
+            chunk = next(chunks, "")
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        yield buffer[pos:end]
+        pos = end
+
+
+def iter_chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _clean_chunk(chunk, serialize):
+    # Parsing happens here rather than in the parent, which only ships text
+    cleaned = clean_albums_data([json.loads(raw) for raw in chunk], limit=None)
+    if serialize:
+        return "".join(json.dumps(a, ensure_ascii=False) + "\n" for a in cleaned)
+    return cleaned
+
+
+def clean_albums_parallel(albums, workers=None, chunk_size=1000, serialize=False):
+    """Clean albums in chunks across a process pool, yielding results in order.
+
+    At most two chunks per worker are in flight, which keeps memory bounded
+    while the parser stays ahead of the pool.
+    """
+    workers = workers or os.cpu_count() or 1
+    clean = partial(_clean_chunk, serialize=serialize)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for chunk in iter_chunks(albums, chunk_size):
+            in_flight.append(pool.submit(clean, chunk))
+            if len(in_flight) >= workers * 2:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def write_data_from_file(input_file, output_file, workers=None, chunk_size=1000):
+    """Clean a raw album dump into newline-delimited JSON"""
+    count = 0
+    with open(input_file, "r", encoding="utf-8") as f_in, open(
+        output_file, "w", encoding="utf-8"
+    ) as f_out:
+        albums = iter_raw_albums(f_in)
+        for lines in clean_albums_parallel(albums, workers, chunk_size, True):
+            f_out.write(lines)
+            count += lines.count("\n")
+    return count
+
+
+def load_data_from_file(input_file, collection_name, workers=None, chunk_size=1000):
+    """Clean a raw album dump and insert it into Mongo in batches"""
+    from lib.pymongo_client import create_pymongo_client
+
+    mongo_db = create_pymongo_client(collection_name)
+    count = 0
+    with open(input_file, "r", encoding="utf-8") as f_in:
+        albums = iter_raw_albums(f_in)
+        for cleaned in clean_albums_parallel(albums, workers, chunk_size):
+            mongo_db.insert_many(cleaned)
+            count += len(cleaned)
+    return count
 
-    cleaned = clean_albums_data(albums)
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(cleaned, f, ensure_ascii=False, indent=2)
 
 if __name__ == "__main__":
-    write_data_from_file("albums.json", "albums_clean.json")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", nargs="?", default="lib/albums.json")
+    parser.add_argument("output", nargs="?", default="lib/albums_clean.jsonl")
+    parser.add_argument("--collection", help="insert into Mongo instead")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.collection:
+        count = load_data_from_file(
+            args.input, args.collection, args.workers, args.chunk_size
+        )
+    else:
+        count = write_data_from_file(
+            args.input, args.output, args.workers, args.chunk_size
+        )
+    print(f"Cleaned {count} albums")
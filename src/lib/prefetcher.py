@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.cache import LRUCache
+from lib.circuit_breaker import CircuitBreaker
+from lib.settings import get_settings
+from lib.spotipy_client import TRACK_CACHE
+
+
+class TokenBucket:
+    """Allow `per_minute` takes per minute, refilled continuously"""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def available(self):
+        now = time.monotonic()
+        refill = (now - self.updated) * self.rate
+        self.tokens = min(self.capacity, self.tokens + refill)
+        self.updated = now
+        return self.tokens >= 1
+
+    def take(self):
+        if not self.available():
+            return False
+        self.tokens -= 1
+        return True
+
+
+class TrackPrefetcher:
+    """Warm the track-list cache for albums a user is likely to open next.
+
+    Prefetches run on a small dedicated pool so they never compete with the
+    request threads for workers, are dropped when the queue is full, and are
+    limited by a per-user and a global budget to protect the API quota.
+    """
+
+    def __init__(self, settings=None):
+        self._settings = settings
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        self._queued = set()
+        self._user_budgets = LRUCache(maxsize=10000)
+        self._global_budget = None
+
+    @property
+    def settings(self):
+        if self._settings is None:
+            self._settings = get_settings()
+        return self._settings
+
+    def prefetch(self, client, album_ids, username=""):
+        """Queue the track lists of the first N albums, return how many queued"""
+        if client.breaker.state != CircuitBreaker.CLOSED:
+            return 0
+        settings = self.settings
+        queued = 0
+        with self._lock:
+            self._ensure_pool()
+            user_budget = self._user_budgets.get(username)
+            if user_budget is None:
+                user_budget = TokenBucket(settings.prefetch_user_per_min)
+                self._user_budgets.set(username, user_budget)
+
+            for album_id in album_ids[: settings.prefetch_top_n]:
+                if not album_id or album_id in self._queued:
+                    continue
+                if album_id in TRACK_CACHE:
+                    continue
+                if len(self._queued) >= settings.prefetch_queue_size:
+                    break
+                # Check both before spending, so a global refusal doesn't
+                # burn the user's budget
+                if not (user_budget.available() and self._global_budget.available()):
+                    break
+                user_budget.take()
+                self._global_budget.take()
+                self._queued.add(album_id)
+                self._pool.submit(self._fetch, client, album_id)
+                queued += 1
+        return queued
+
+    def _ensure_pool(self):
+        # Created lazily, and again after a fork, so no threads exist at import
+        if self._pid != os.getpid():
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.settings.prefetch_workers,
+                thread_name_prefix="prefetch",
+            )
+            self._pid = os.getpid()
+            self._queued = set()
+            self._global_budget = TokenBucket(self.settings.prefetch_global_per_min)
+
+    def _fetch(self, client, album_id):
+        try:
+            client.get_track_data(album_id, background=True)
+        except Exception as exc:
+            print(exc)
+        finally:
+            with self._lock:
+                self._queued.discard(album_id)
+
+
+TRACK_PREFETCHER = TrackPrefetcher()
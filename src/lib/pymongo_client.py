@@ -1,25 +1,188 @@
 import os
+import threading
+import time
 
 import certifi
-from dotenv import load_dotenv
+from pymongo import monitoring
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
 
-load_dotenv()
+from lib.settings import get_settings
 
 
 def create_pymongo_client(collection_name):
-    uri = os.getenv("DB_CONNECTION")
-    return PymongoClient(uri, collection_name)
+    return REGISTRY.collection(collection_name)
 
 
-class PymongoClient:
-    def __init__(self, uri, collection_name, db_name="appDb"):
-        self.client = MongoClient(
-            uri, server_api=ServerApi("1"), tlsCAFile=certifi.where()
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Track pool checkout waits and connections in use for one MongoClient"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.in_use = 0
+        self.max_in_use = 0
+        self.open = 0
+        self.checkouts = 0
+        self.failed_checkouts = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "inUse": self.in_use,
+                "maxInUse": self.max_in_use,
+                "open": self.open,
+                "checkouts": self.checkouts,
+                "failedCheckouts": self.failed_checkouts,
+                "avgWaitMs": round(self.total_wait_ms / self.checkouts, 3)
+                if self.checkouts
+                else 0.0,
+                "maxWaitMs": round(self.max_wait_ms, 3),
+            }
+
+    def _wait_ms(self):
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        return (time.perf_counter() - started) * 1000 if started else 0.0
+
+    # Checkouts happen on the requesting thread, so a thread-local start time
+    # pairs each started event with its checked out/failed event
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        wait_ms = self._wait_ms()
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+
+    def connection_check_out_failed(self, event):
+        self._wait_ms()
+        with self._lock:
+            self.failed_checkouts += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+
+class MongoRegistry:
+    """Hand out collection wrappers backed by one shared MongoClient per URI.
+
+    Clients are created on first use and recreated after a fork, so the app can
+    be imported (and forked by gunicorn --preload) without opening sockets.
+    """
+
+    def __init__(self, settings=None):
+        self._settings = settings
+        self._lock = threading.Lock()
+        self._clients = {}  # uri -> (MongoClient, PoolMetrics)
+        self._pid = None
+
+    @property
+    def settings(self):
+        if self._settings is None:
+            self._settings = get_settings()
+        return self._settings
+
+    def collection(self, collection_name, db_name="appDb", uri=None):
+        return PymongoClient(
+            uri or self.settings.db_connection, collection_name, db_name, self
+        )
+
+    def client(self, uri):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Sockets inherited from the parent process must not be reused
+                self._clients = {}
+                self._pid = os.getpid()
+            if uri not in self._clients:
+                metrics = PoolMetrics()
+                self._clients[uri] = (self._create_client(uri, metrics), metrics)
+            return self._clients[uri][0]
+
+    def metrics(self):
+        """Return pool metrics per connected URI, with credentials stripped"""
+        with self._lock:
+            return {
+                uri.rsplit("@", 1)[-1]: metrics.snapshot()
+                for uri, (_, metrics) in self._clients.items()
+            }
+
+    def close(self):
+        with self._lock:
+            for client, _ in self._clients.values():
+                client.close()
+            self._clients = {}
+
+    def _create_client(self, uri, metrics):
+        settings = self.settings
+        options = {
+            "maxPoolSize": settings.mongo_max_pool_size,
+            "waitQueueTimeoutMS": settings.mongo_wait_queue_timeout_ms,
+            "readPreference": settings.mongo_read_preference,
+        }
+        if settings.mongo_compressors:
+            options["compressors"] = settings.mongo_compressors
+        return MongoClient(
+            uri,
+            server_api=ServerApi("1"),
+            tlsCAFile=certifi.where(),
+            event_listeners=[metrics],
+            **options,
         )
-        self.db = self.client[db_name]
-        self.collection = self.db[collection_name]
+
+
+class PymongoClient:
+    def __init__(self, uri, collection_name, db_name="appDb", registry=None):
+        self.uri = uri
+        self.db_name = db_name
+        self.collection_name = collection_name
+        self.registry = registry or REGISTRY
+
+    @property
+    def client(self):
+        return self.registry.client(self.uri)
+
+    @property
+    def db(self):
+        return self.client[self.db_name]
+
+    @property
+    def collection(self):
+        return self.db[self.collection_name]
+
+    def warm_up(self):
+        """Open the connection pool now instead of on the first request"""
+        self.client.admin.command("ping")
 
     # def __del__(self):
     #     self.client.close()
@@ -27,6 +190,9 @@ class PymongoClient:
     def insert_one(self, document):
         return self.collection.insert_one(document).inserted_id
 
+    def insert_many(self, documents, ordered=False):
+        return self.collection.insert_many(documents, ordered=ordered).inserted_ids
+
     def find_one(self, query):
         result = self.collection.find_one(query)
         self.clean_id(result)
@@ -38,6 +204,12 @@ class PymongoClient:
     def update_one(self, query, update):
         return self.collection.update_one(query, update)
 
+    def update_many(self, query, update):
+        return self.collection.update_many(query, update)
+
+    def bulk_write(self, requests, ordered=True):
+        return self.collection.bulk_write(requests, ordered=ordered)
+
     def delete_one(self, query):
         return self.collection.delete_one(query)
 
@@ -47,3 +219,6 @@ class PymongoClient:
     def clean_id(self, doc):
         if doc:
             doc["_id"] = str(doc["_id"])
+
+
+REGISTRY = MongoRegistry()
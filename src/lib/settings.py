@@ -0,0 +1,67 @@
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+
+@dataclass(frozen=True)
+class Settings:
+    secret_app_key: str | None
+    db_connection: str | None
+    client_id: str | None
+    client_secret: str | None
+    redirect_uri: str | None
+    scope: str | None
+    spotify_timeout_s: float
+    spotify_breaker_threshold: int
+    spotify_breaker_reset_s: float
+    profile_deadline_s: float
+    profile_hydrate_workers: int
+    prefetch_top_n: int
+    prefetch_workers: int
+    prefetch_queue_size: int
+    prefetch_user_per_min: int
+    prefetch_global_per_min: int
+    mongo_max_pool_size: int
+    mongo_wait_queue_timeout_ms: int
+    # zstd and snappy need the optional zstandard / python-snappy packages,
+    # pymongo drops (with a warning) any compressor that isn't installed
+    mongo_compressors: str
+    mongo_read_preference: str
+    metrics_token: str | None
+    like_journal_dir: str
+    import_budget_ms: float
+
+
+@lru_cache(maxsize=1)
+def get_settings():
+    """Load the environment once and return the immutable app settings"""
+    load_dotenv()
+    return Settings(
+        secret_app_key=os.getenv("SECRET_APP_KEY"),
+        db_connection=os.getenv("DB_CONNECTION"),
+        client_id=os.getenv("CLIENT_ID"),
+        client_secret=os.getenv("CLIENT_SECRET"),
+        redirect_uri=os.getenv("REDIRECT_URI"),
+        scope=os.getenv("SCOPE"),
+        spotify_timeout_s=float(os.getenv("SPOTIFY_TIMEOUT_S", "3")),
+        spotify_breaker_threshold=int(os.getenv("SPOTIFY_BREAKER_THRESHOLD", "5")),
+        spotify_breaker_reset_s=float(os.getenv("SPOTIFY_BREAKER_RESET_S", "30")),
+        profile_deadline_s=float(os.getenv("PROFILE_DEADLINE_S", "1.5")),
+        profile_hydrate_workers=int(os.getenv("PROFILE_HYDRATE_WORKERS", "16")),
+        prefetch_top_n=int(os.getenv("PREFETCH_TOP_N", "6")),
+        prefetch_workers=int(os.getenv("PREFETCH_WORKERS", "2")),
+        prefetch_queue_size=int(os.getenv("PREFETCH_QUEUE_SIZE", "64")),
+        prefetch_user_per_min=int(os.getenv("PREFETCH_USER_PER_MIN", "30")),
+        prefetch_global_per_min=int(os.getenv("PREFETCH_GLOBAL_PER_MIN", "300")),
+        mongo_max_pool_size=int(os.getenv("MONGO_MAX_POOL_SIZE", "20")),
+        mongo_wait_queue_timeout_ms=int(
+            os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000")
+        ),
+        mongo_compressors=os.getenv("MONGO_COMPRESSORS", ""),
+        mongo_read_preference=os.getenv("MONGO_READ_PREFERENCE", "primary"),
+        metrics_token=os.getenv("METRICS_TOKEN"),
+        like_journal_dir=os.getenv("LIKE_JOURNAL_DIR", ".likes"),
+        import_budget_ms=float(os.getenv("IMPORT_BUDGET_MS", "500")),
+    )
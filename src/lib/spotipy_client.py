@@ -1,13 +1,45 @@
 # spotify_client.py
 import json
-import os
 import time
+from functools import lru_cache
 
+import requests
 import spotipy
-from dotenv import load_dotenv
+from spotipy.exceptions import SpotifyException
 from spotipy.oauth2 import SpotifyOAuth
 
-from lib.enums import SpotifyClientNotAuthenticated
+from lib.cache import LRUCache
+from lib.circuit_breaker import CircuitBreaker
+from lib.enums import SpotifyClientNotAuthenticated, SpotifyUnavailable
+from lib.settings import get_settings
+
+# Last good album data, served while the Spotify breaker is open
+ALBUM_CACHE = LRUCache(maxsize=4096)
+# Track lists warmed by the prefetcher and served to album clicks
+TRACK_CACHE = LRUCache(maxsize=2048)
+
+
+def is_upstream_failure(exc):
+    """True for errors that mean Spotify itself is unhealthy.
+
+    Client errors (bad album id, expired token) are the caller's problem and
+    must not open the breaker shared by every user of the worker.
+    """
+    if isinstance(exc, SpotifyException):
+        status = exc.http_status or 0
+        return status == 429 or status >= 500
+    return isinstance(
+        exc, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)
+    )
+
+
+@lru_cache(maxsize=1)
+def get_spotify_breaker():
+    """Return the breaker shared by every client in this worker"""
+    settings = get_settings()
+    return CircuitBreaker(
+        settings.spotify_breaker_threshold, settings.spotify_breaker_reset_s
+    )
 
 
 def create_spotify_client(token_info=None):
@@ -22,11 +54,14 @@ def create_spotify_client(token_info=None):
 
 class SpotipyClient:
     def __init__(self):
-        load_dotenv()
-        self.client_id = os.getenv("CLIENT_ID")
-        self.client_secret = os.getenv("CLIENT_SECRET")
-        self.redirect_uri = os.getenv("REDIRECT_URI")
-        self.scope = os.getenv("SCOPE")
+        settings = get_settings()
+        self.requests_timeout = settings.spotify_timeout_s
+        self.breaker = get_spotify_breaker()
+        self.sp_guarded = None
+        self.client_id = settings.client_id
+        self.client_secret = settings.client_secret
+        self.redirect_uri = settings.redirect_uri
+        self.scope = settings.scope
         self.auth_manager = SpotifyOAuth(
             client_id=self.client_id,
             client_secret=self.client_secret,
@@ -60,12 +95,47 @@ class SpotipyClient:
             token_info["expires_at"] = refreshed["expires_at"]
 
         self.sp = spotipy.Spotify(auth=token_info["access_token"])
+        # Album and track hydration fail fast instead of retrying, the breaker
+        # and the caches cover upstream incidents. Other calls have no
+        # fallback, so they keep spotipy's default retries
+        self.sp_guarded = spotipy.Spotify(
+            auth=token_info["access_token"],
+            requests_timeout=self.requests_timeout,
+            retries=0,
+        )
         return token_info
 
+    def is_authenticated(self):
+        return self.sp is not None
+
     def _check_authentication(self):
         if not self.sp:
             raise SpotifyClientNotAuthenticated()
 
+    def _guarded_call(self, method, *args, background=False, **kwargs):
+        """Call Spotify through the shared circuit breaker.
+
+        Background calls only run while the breaker is closed and never
+        record outcomes, so prefetching can't open it for interactive users.
+        """
+        if background:
+            if self.breaker.state != CircuitBreaker.CLOSED:
+                raise SpotifyUnavailable("Spotify circuit not closed")
+            return method(*args, **kwargs)
+        if not self.breaker.allow():
+            raise SpotifyUnavailable("Spotify circuit open")
+        try:
+            result = method(*args, **kwargs)
+        except Exception as exc:
+            # Spotify answered client errors, so they count as healthy
+            if is_upstream_failure(exc):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return result
+
     # PUBLIC METHODS
     def get_username(self):
         self._check_authentication()
@@ -74,20 +144,27 @@ class SpotipyClient:
     def get_album_data(self, album_id):
         """Return album data given an album id"""
         self._check_authentication()
-        album = self.sp.album(album_id)
+        album = self._guarded_call(self.sp_guarded.album, album_id)
         cover_url = album.get("images", [{}])[0].get("url")
-        return {
+        data = {
             "name": album["name"],
             "release_date": album["release_date"],
             "artists": [a["name"] for a in album.get("artists", [])],
             "image": cover_url,
             "external_url": album.get("external_urls", {}).get("spotify"),
         }
+        ALBUM_CACHE.set(album_id, data)
+        return data
 
-    def get_track_data(self, album_id):
-        """Return track data given an album id"""
+    def get_track_data(self, album_id, background=False):
+        """Return track data given an album id, `background` for prefetches"""
         self._check_authentication()
-        results = self.sp.album_tracks(album_id, limit=50)
+        cached = TRACK_CACHE.get(album_id)
+        if cached is not None:
+            return cached
+        results = self._guarded_call(
+            self.sp_guarded.album_tracks, album_id, limit=50, background=background
+        )
         tracks = []
 
         for item in results.get("items", []):
@@ -101,6 +178,7 @@ class SpotipyClient:
                     "artists": [a.get("name") for a in item.get("artists", [])],
                 }
             )
+        TRACK_CACHE.set(album_id, tracks)
         return tracks
 
     def generic_search(self, query, limit=10):
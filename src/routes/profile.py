@@ -1,10 +1,89 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
 from flask import jsonify
 
-from lib.enums import DatabaseError, ReturnTypes, SpotifyAPIError
-from lib.spotipy_client import SpotipyClient
+from lib.enums import (
+    DatabaseError,
+    ReturnTypes,
+    SpotifyClientNotAuthenticated,
+    SpotifyUnavailable,
+)
+from lib.prefetcher import TRACK_PREFETCHER
+from lib.settings import get_settings
+from lib.spotipy_client import ALBUM_CACHE, SpotipyClient
+
+# Album lookups run here so a slow one can't hold the request past its deadline
+_HYDRATE_POOL = None
+_HYDRATE_POOL_PID = None
+_HYDRATE_POOL_LOCK = threading.Lock()
+
+
+def get_hydrate_pool():
+    """Return this worker's hydration pool, created lazily and after fork"""
+    global _HYDRATE_POOL, _HYDRATE_POOL_PID
+    with _HYDRATE_POOL_LOCK:
+        if _HYDRATE_POOL_PID != os.getpid():
+            _HYDRATE_POOL = ThreadPoolExecutor(
+                max_workers=get_settings().profile_hydrate_workers,
+                thread_name_prefix="hydrate",
+            )
+            _HYDRATE_POOL_PID = os.getpid()
+        return _HYDRATE_POOL
+
+
+def _reset_hydrate_lock():
+    # Another thread may have held the lock when the parent forked
+    global _HYDRATE_POOL_LOCK
+    _HYDRATE_POOL_LOCK = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_hydrate_lock)
+
 
+def hydrate_albums(albums, client: SpotipyClient, deadline):
+    """Merge Spotify data into albums, waiting at most `deadline` seconds.
 
-def get_profile_data(username, mongo_db, client: SpotipyClient):
+    Albums not hydrated in time fall back to the last cached Spotify data
+    marked `stale`, or keep only their stored fields marked `pending`.
+    Returns True if any album could not be hydrated. Upstream timeouts are
+    reported to the breaker by the spotipy request timeout, not by a missed
+    deadline, which may just mean the pool is busy with other requests.
+    """
+    if not albums:
+        return False
+    if not client.is_authenticated():
+        raise SpotifyClientNotAuthenticated()
+
+    pool = get_hydrate_pool()
+    futures = {
+        pool.submit(client.get_album_data, album["albumId"]): album
+        for album in albums
+    }
+    done, not_done = wait(futures, timeout=deadline)
+    # Lookups still running finish in the background and warm the album cache
+    for future in not_done:
+        future.cancel()
+
+    partial = False
+    for future, album in futures.items():
+        if future in done and not future.exception():
+            album.update(future.result())
+            continue
+        if future in done and not isinstance(future.exception(), SpotifyUnavailable):
+            print(future.exception())
+        partial = True
+        cached = ALBUM_CACHE.get(album["albumId"])
+        if cached:
+            album.update(cached)
+            album["stale"] = True
+        else:
+            album["pending"] = True
+    return partial
+
+
+def get_profile_data(username, mongo_db, client: SpotipyClient, viewer=""):
     """Query mongo for profile data and Spotify for album data"""
 
     # Query DB
@@ -17,13 +96,17 @@ def get_profile_data(username, mongo_db, client: SpotipyClient):
     if not data:
         return ReturnTypes.UserDataNotFound, 404
 
-    # Query spotify
+    # Query spotify under the request deadline
+    data["partial"] = hydrate_albums(
+        data.get("albums", []), client, get_settings().profile_deadline_s
+    )
     try:
-        for album in data.get("albums", []):
-            album.update(client.get_album_data(album["albumId"]))
+        TRACK_PREFETCHER.prefetch(
+            client, [a["albumId"] for a in data.get("albums", [])], viewer
+        )
     except Exception as exc:
+        # Prefetching is best effort and must not fail the profile
         print(exc)
-        return str(SpotifyAPIError(exc)), 500
 
     # Process spotify results
     ranked, bookmarked, rank_sum = 0, 0, 0
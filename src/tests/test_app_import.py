@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SRC = Path(__file__).resolve().parents[1]
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "500"))
+
+MEASURE = """
+import json, time
+started = time.perf_counter()
+import app
+print(json.dumps({"ms": (time.perf_counter() - started) * 1000}))
+"""
+
+
+def test_app_import_is_fast_with_mongo_unreachable():
+    for module in ("flask", "flask_cors", "pymongo", "spotipy", "dotenv"):
+        pytest.importorskip(module)
+    if not (SRC / "routes" / "social.py").exists():
+        pytest.skip("routes.social is not part of this tree, app can't import")
+
+    # Nothing listens here, importing must not try to connect
+    env = dict(os.environ, DB_CONNECTION="mongodb://127.0.0.1:1")
+    # Warm the bytecode cache so we measure import work, not compilation
+    subprocess.run([sys.executable, "-c", "import app"], cwd=SRC, env=env, check=True)
+    result = subprocess.run(
+        [sys.executable, "-c", MEASURE],
+        cwd=SRC,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    import_ms = json.loads(result.stdout.strip().splitlines()[-1])["ms"]
+    assert import_ms < IMPORT_BUDGET_MS
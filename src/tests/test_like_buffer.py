@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+
+import pytest
+
+pytest.importorskip("pymongo")
+pytest.importorskip("dotenv")
+
+from pymongo.errors import BulkWriteError  # noqa: E402
+
+from lib.like_buffer import LikeBuffer  # noqa: E402
+
+
+class StubDB:
+    def __init__(self):
+        self.batches = []
+        self.error = None
+
+    def bulk_write(self, requests, ordered=True):
+        self.batches.append(requests)
+        if self.error:
+            error, self.error = self.error, None
+            raise error
+
+
+@pytest.fixture
+def buffer(tmp_path):
+    like_buffer = LikeBuffer(StubDB(), journal_dir=str(tmp_path), flush_interval=3600)
+    yield like_buffer
+    like_buffer._stop.set()
+
+
+def journal_files(path):
+    return sorted(os.listdir(path))
+
+
+def test_one_update_per_post(buffer):
+    for user in ("amy", "bob", "cat"):
+        buffer.like("owner", "album1", user)
+    buffer.like("owner", "album2", "amy")
+    buffer.flush()
+
+    requests = buffer.mongo_db.batches[0]
+    assert [r._filter["posts.albumId"] for r in requests] == ["album1", "album2"]
+
+
+def test_like_then_unlike_cancels_out(buffer):
+    buffer.like("owner", "album1", "amy")
+    buffer.unlike("owner", "album1", "amy")
+    assert buffer._pending == {}
+
+    buffer.flush()
+    assert buffer.mongo_db.batches == []
+
+
+def test_repeated_likes_coalesce(buffer):
+    buffer.like("owner", "album1", "amy")
+    buffer.like("owner", "album1", "amy")
+    assert buffer._pending == {("owner", "album1"): {"amy": 1}}
+
+
+def test_update_is_set_based(buffer):
+    buffer.like("owner", "album1", "amy")
+    buffer.unlike("owner", "album1", "eve")
+    buffer.flush()
+
+    update = json.dumps(buffer.mongo_db.batches[0][0]._doc)
+    assert "$setUnion" in update and "$setDifference" in update
+    assert "$inc" not in update
+
+
+def test_replays_dead_and_own_pid_journals(tmp_path):
+    event = {"o": "owner", "a": "album1", "u": "amy", "d": 1}
+    own = tmp_path / f"likes-{os.getpid()}-1.jsonl"
+    own.write_text(json.dumps(event) + "\n")
+    stale_claim = tmp_path / "likes-999999999-1.jsonl.999999998.claimed"
+    stale_claim.write_text(json.dumps(dict(event, u="bob")) + "\n")
+
+    like_buffer = LikeBuffer(StubDB(), journal_dir=str(tmp_path), flush_interval=3600)
+    like_buffer.start()
+    try:
+        assert like_buffer._pending == {("owner", "album1"): {"amy": 1, "bob": 1}}
+        like_buffer.flush()
+        assert journal_files(tmp_path) == [os.path.basename(like_buffer._journal_path)]
+    finally:
+        like_buffer._stop.set()
+
+
+def test_bulk_write_error_retries_only_failed_posts(buffer):
+    buffer.like("owner", "album1", "amy")
+    buffer.like("owner", "album2", "bob")
+    buffer.mongo_db.error = BulkWriteError({"writeErrors": [{"index": 1}]})
+
+    with pytest.raises(BulkWriteError):
+        buffer.flush()
+    assert buffer._pending == {("owner", "album2"): {"bob": 1}}
+
+    # The retried events are journaled again, the sealed journal is gone
+    journal = journal_files(buffer.journal_dir)
+    assert len(journal) == 1
+    with open(os.path.join(buffer.journal_dir, journal[0])) as f:
+        assert [json.loads(line)["u"] for line in f] == ["bob"]
+
+
+def test_retry_does_not_override_newer_action(buffer):
+    buffer.like("owner", "album1", "amy")
+    buffer.mongo_db.error = RuntimeError("network")
+    buffer.mongo_db.bulk_write = _unlike_during_write(buffer, buffer.mongo_db.bulk_write)
+
+    with pytest.raises(RuntimeError):
+        buffer.flush()
+    assert buffer._pending == {("owner", "album1"): {"amy": -1}}
+
+
+def _unlike_during_write(like_buffer, bulk_write):
+    def write(requests, ordered=True):
+        like_buffer.unlike("owner", "album1", "amy")
+        return bulk_write(requests, ordered)
+
+    return write
+
+
+def test_concurrent_start_opens_one_journal(buffer):
+    threads = [threading.Thread(target=buffer.start) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(journal_files(buffer.journal_dir)) == 1
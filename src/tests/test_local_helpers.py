@@ -0,0 +1,70 @@
+import io
+import json
+
+import pytest
+
+from lib.local_helpers import (
+    clean_albums_parallel,
+    iter_json_albums,
+    iter_raw_albums,
+    write_data_from_file,
+)
+from lib.spotify_helpers import clean_albums_data
+
+ALBUMS = [
+    {
+        "id": f"album{i}",
+        "name": f'Tricky ], "name" {{ [{i}] \\ é',
+        "artists": [{"name": 'A "quoted" artist ],'}],
+        "images": [{"url": f"https://img/{i}"}],
+        "external_urls": {"spotify": f"https://open/{i}"},
+        "tracks": [{"name": "x]", "id": str(i)}],
+        "release_date": "2024-01-01",
+    }
+    for i in range(25)
+]
+
+
+@pytest.mark.parametrize("read_size", [1, 2, 3, 7, 64, 1 << 20])
+def test_array_albums_straddle_read_windows(read_size):
+    text = json.dumps(ALBUMS, indent=2)
+    assert list(iter_json_albums(io.StringIO(text), read_size)) == ALBUMS
+
+
+@pytest.mark.parametrize("read_size", [1, 5, 64])
+def test_ndjson_albums_straddle_read_windows(read_size):
+    text = "".join(json.dumps(a) + "\n" for a in ALBUMS)
+    assert list(iter_json_albums(io.StringIO(text), read_size)) == ALBUMS
+
+
+def test_raw_albums_are_exact_json_slices():
+    text = json.dumps(ALBUMS)
+    raw = list(iter_raw_albums(io.StringIO(text), read_size=11))
+    assert [json.loads(r) for r in raw] == ALBUMS
+    assert all(r.startswith("{") and r.endswith("}") for r in raw)
+
+
+def test_truncated_array_is_an_error():
+    text = json.dumps(ALBUMS)[:-40]
+    with pytest.raises(ValueError):
+        list(iter_raw_albums(io.StringIO(text), read_size=16))
+
+
+def test_parallel_clean_matches_serial(tmp_path):
+    source = tmp_path / "albums.json"
+    source.write_text(json.dumps(ALBUMS), encoding="utf-8")
+    target = tmp_path / "albums.jsonl"
+
+    count = write_data_from_file(source, target, workers=2, chunk_size=4)
+
+    lines = target.read_text(encoding="utf-8").splitlines()
+    assert count == len(ALBUMS)
+    assert [json.loads(line) for line in lines] == clean_albums_data(
+        ALBUMS, limit=None
+    )
+
+
+def test_clean_albums_parallel_keeps_order():
+    raw = [json.dumps(a) for a in ALBUMS]
+    cleaned = [a for chunk in clean_albums_parallel(raw, 3, 2) for a in chunk]
+    assert [a["albumId"] for a in cleaned] == [a["id"] for a in ALBUMS]